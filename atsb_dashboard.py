@@ -1,120 +1,178 @@
 #!/usr/bin/env python3
-import json
+import codecs
+import functools
+import hashlib
+import heapq
+import os
 import re
-from collections import Counter
-from datetime import datetime
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from html import escape
 from pathlib import Path
 
+import lxml.html
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import requests
-from bs4 import BeautifulSoup
 from plotly.subplots import make_subplots
+from requests.adapters import HTTPAdapter
 
 BASE = "https://www.atsb.gov.au"
 LIST_URL = f"{BASE}/aviation-investigation-reports"
 DATA_DIR = Path("data")
 OUT_DIR = Path("outputs")
+CACHE_DIR = DATA_DIR / "cache"
+CACHE_TTL = 3600  # seconds
+
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=16))
+
+_WS_RE = re.compile(r"\s+")
+_AIRCRAFT_RE = re.compile(r"involving\s+([^,]+),", re.I)
+_LOCATION_RE = re.compile(r"(?:near|at|about|off|west of|east of|south of|north of)\s+(.+?),\s+on\s+\d", re.I)
+_CHARSET_RE = re.compile(r"charset=[\"']?([A-Za-z0-9._:-]+)", re.I)
+
+_HREF_SUB = "/publications/investigation_reports/"
 
 
 def clean(text: str) -> str:
-    return re.sub(r"\s+", " ", (text or "")).strip()
+    return _WS_RE.sub(" ", text or "").strip()
+
+
+# Text of an element and its descendants, space-joined and whitespace-collapsed.
+def _el_text(el) -> str:
+    return clean(" ".join(el.itertext()))
 
 
-def fetch_soup(url: str) -> BeautifulSoup:
-    resp = requests.get(url, timeout=30)
+# The declared charset if it names a real codec, else None.
+def _known_encoding(name: str):
+    try:
+        codecs.lookup(name)
+    except LookupError:
+        return None
+    return name
+
+
+# Returns (content, encoding). The encoding is only the charset the server declared (None leaves it
+# to the parser's <meta> detection) and is stored on the first line of the cache entry, so hits and
+# misses decode the same way.
+def fetch_bytes(url: str):
+    path = CACHE_DIR / f"{hashlib.sha1(url.encode('utf-8')).hexdigest()}.cache"
+    if path.exists() and time.time() - path.stat().st_mtime < CACHE_TTL:
+        charset, _, content = path.read_bytes().partition(b"\n")
+        return content, _known_encoding(charset.decode("ascii")) if charset else None
+    resp = SESSION.get(url, timeout=30)
     resp.raise_for_status()
-    return BeautifulSoup(resp.text, "lxml")
+    m = _CHARSET_RE.search(resp.headers.get("Content-Type", ""))
+    encoding = _known_encoding(m.group(1)) if m else None
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    # Write-then-rename so an interrupted run never leaves a truncated entry behind.
+    fd, tmp = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write((encoding or "").encode("ascii") + b"\n" + resp.content)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return resp.content, encoding
+
+
+def fetch_tree(url: str) -> lxml.html.HtmlElement:
+    content, encoding = fetch_bytes(url)
+    try:
+        parser = lxml.html.HTMLParser(encoding=encoding) if encoding else None
+    except LookupError:  # a codec Python knows but libxml2 doesn't
+        parser = None
+    return lxml.html.fromstring(content, parser=parser)
 
 
 def parse_listing(limit: int = 10):
-    soup = fetch_soup(LIST_URL)
-    rows = soup.select("table tbody tr")
-    items = []
-    for tr in rows:
-        links = tr.select('a[href*="/publications/investigation_reports/"]')
+    doc = fetch_tree(LIST_URL)
+    # Keyed by report number so later duplicates replace earlier rows.
+    dedup: dict[str, dict] = {}
+    for tr in doc.xpath("//table//tbody/tr"):
+        links = tr.xpath(f'.//a[contains(@href, "{_HREF_SUB}")]')
         if not links:
             continue
-        title_link = next((a for a in links if "AO-" not in a.get_text(" ", strip=True).upper() and "AA-" not in a.get_text(" ", strip=True).upper()), links[0])
+        title_link = next((a for a in links if "AO-" not in _el_text(a).upper() and "AA-" not in _el_text(a).upper()), links[0])
         code_link = links[-1]
-        tds = [clean(td.get_text(" ", strip=True)) for td in tr.select("td")]
-        title = clean(title_link.get_text(" ", strip=True))
+        tds = [_el_text(td) for td in tr.xpath("./td")]
+        title = _el_text(title_link)
         href = title_link.get("href", "")
         if href.startswith("/"):
             href = BASE + href
-        report_no = clean(code_link.get_text(" ", strip=True))
+        report_no = _el_text(code_link)
         date_str = tds[2] if len(tds) > 2 else ""
         status = tds[3] if len(tds) > 3 else ""
-        try:
-            occ_date = datetime.strptime(date_str, "%d/%m/%Y")
-        except Exception:
-            occ_date = None
-        items.append(
-            {
-                "report_no": report_no,
-                "title": title,
-                "report_url": href,
-                "occurrence_date": occ_date,
-                "occurrence_date_text": date_str,
-                "investigation_status": status,
-            }
-        )
-
-    # De-dup and sort by date desc
-    dedup = {}
-    for it in items:
-        dedup[it["report_no"]] = it
-    items = list(dedup.values())
-    items.sort(key=lambda x: x["occurrence_date"] or datetime.min, reverse=True)
-    return items[:limit]
-
-
-def extract_summary_text(soup: BeautifulSoup) -> str:
-    main = soup.select_one("main") or soup
-    paragraphs = [clean(p.get_text(" ", strip=True)) for p in main.select("p")]
-    paragraphs = [p for p in paragraphs if len(p) > 40]
-    return "\n\n".join(paragraphs[:4])
-
-
-def classify_cause(text: str):
-    t = text.lower()
-    mapping = {
+        dedup[report_no] = {
+            "report_no": report_no,
+            "title": title,
+            "report_url": href,
+            "occurrence_date": None,  # parsed below, in one pass over all rows
+            "occurrence_date_text": date_str,
+            "investigation_status": status,
+        }
+
+    rows = list(dedup.values())
+    dates = pd.to_datetime([r["occurrence_date_text"] for r in rows], format="%d/%m/%Y", errors="coerce")
+    for row, date in zip(rows, dates):
+        row["occurrence_date"] = date
+    # Newest `limit` rows by date, without sorting the whole listing; missing/impossible dates sort last.
+    keys = dates.fillna(pd.Timestamp.min)
+    return [rows[i] for i in heapq.nlargest(limit, range(len(rows)), key=keys.__getitem__)]
+
+
+def extract_summary_text(tree: lxml.html.HtmlElement) -> str:
+    mains = tree.xpath("//main")
+    root = mains[0] if mains else tree
+    out = []
+    for p in root.iter("p"):
+        s = _el_text(p)
+        if len(s) > 40:
+            out.append(s)
+            if len(out) == 4:
+                break
+    return "\n\n".join(out)
+
+
+def _keyword_res(mapping):
+    return [(label, re.compile("|".join(map(re.escape, kws)))) for label, kws in mapping.items()]
+
+
+# Checked in order; the first category with a keyword hit wins.
+_CAUSE_RES = _keyword_res(
+    {
         "Collision with terrain": ["collision with terrain", "controlled flight into terrain", "cfit"],
         "Near collision / airprox": ["near collision", "proximity event", "airprox", "midair"],
         "Ditching / water impact": ["ditching", "water"],
         "Mechanical / system issue": ["engine", "landing gear", "rotor", "foreign object", "f.o.d", "indication", "failure"],
         "Operational event": ["fuel", "runway", "navigation", "weather", "vfr", "imc"],
     }
-    for label, kws in mapping.items():
-        if any(k in t for k in kws):
-            return label
-    return "Other / undetermined"
-
-
-def classify_severity(text: str):
-    t = text.lower()
-    if "fatal" in t or "sustained fatal injuries" in t:
-        return "Fatal"
-    if "serious injury" in t:
-        return "Serious injury"
-    if "minor injury" in t or "injur" in t:
-        return "Injury"
-    if "no injuries" in t or "no injury" in t:
-        return "No injury"
-    return "Unknown"
+)
+_SEVERITY_RES = _keyword_res(
+    {
+        "Fatal": ["fatal", "sustained fatal injuries"],
+        "Serious injury": ["serious injury"],
+        "Injury": ["minor injury", "injur"],
+        "No injury": ["no injuries", "no injury"],
+    }
+)
 
 
 def parse_aircraft(title: str):
-    m = re.search(r"involving\s+([^,]+),", title, flags=re.I)
+    m = _AIRCRAFT_RE.search(title)
     return clean(m.group(1)) if m else "Unknown"
 
 
 def parse_location(title: str):
-    m = re.search(r"(?:near|at|about|off|west of|east of|south of|north of)\s+(.+?),\s+on\s+\d", title, flags=re.I)
+    m = _LOCATION_RE.search(title)
     return clean(m.group(1)) if m else "Unknown"
 
 
+@functools.lru_cache(maxsize=4096)
 def parse_operation_type(title: str):
     t = title.lower()
     if "helicopter" in t or any(x in t for x in ["r44", "aw139", "bell", "s-92"]):
@@ -126,34 +184,55 @@ def parse_operation_type(title: str):
     return "General aviation"
 
 
+def _analyze(title: str, summary: str):
+    # Cause/severity are assigned for the whole frame at once in classify_frame.
+    return {
+        "title": title,
+        "aircraft": parse_aircraft(title),
+        "location": parse_location(title),
+        "operation_type": parse_operation_type(title),
+        "key_text": summary,
+    }
+
+
+def _label_series(text: pd.Series, rules, default: str) -> pd.Series:
+    labels = pd.Series(None, index=text.index, dtype=object)
+    for label, rx in rules:
+        labels.loc[labels.isna() & text.str.contains(rx)] = label
+    return labels.fillna(default)
+
+
+def classify_frame(df: pd.DataFrame) -> pd.DataFrame:
+    text = (df["title"] + "\n" + df["key_text"]).str.lower()
+    df["cause_category"] = _label_series(text, _CAUSE_RES, "Other / undetermined")
+    df["severity"] = _label_series(text, _SEVERITY_RES, "Unknown")
+    return df
+
+
 def fetch_report_detail(item):
-    soup = fetch_soup(item["report_url"])
-    title = clean((soup.select_one("h1") or soup.select_one("title")).get_text(" ", strip=True)).replace(" | ATSB", "")
-    summary = extract_summary_text(soup)
-    combined = f"{title}\n{summary}"
-    item.update(
-        {
-            "title": title,
-            "aircraft": parse_aircraft(title),
-            "location": parse_location(title),
-            "operation_type": parse_operation_type(title),
-            "key_text": summary,
-            "cause_category": classify_cause(combined),
-            "severity": classify_severity(combined),
-        }
-    )
+    tree = fetch_tree(item["report_url"])
+    heading = tree.find(".//h1")
+    if heading is None:
+        heading = tree.find(".//title")
+    title = _el_text(heading).replace(" | ATSB", "")
+    summary = extract_summary_text(tree)
+    item.update(_analyze(title, summary))
     return item
 
 
-def build_dashboard(df: pd.DataFrame, out_html: Path):
-    cause_counts = df["cause_category"].value_counts().reset_index()
-    cause_counts.columns = ["cause_category", "count"]
+# Escaped table cell text; missing values show as "NaN" like DataFrame.to_html did.
+def _cell(value) -> str:
+    return "NaN" if pd.isna(value) else escape(str(value), quote=True)
+
 
-    sev_counts = df["severity"].value_counts().reset_index()
-    sev_counts.columns = ["severity", "count"]
+def _link_cell(url) -> str:
+    return _cell(url) if pd.isna(url) else f"<a href='{_cell(url)}'>{_cell(url)}</a>"
 
-    op_counts = df["operation_type"].value_counts().reset_index()
-    op_counts.columns = ["operation_type", "count"]
+
+def build_dashboard(df: pd.DataFrame, counts: dict, out_html: Path):
+    cause_counts = counts["cause_category"]
+    sev_counts = counts["severity"]
+    op_counts = counts["operation_type"]
 
     timeline = df.sort_values("occurrence_date")
 
@@ -164,15 +243,15 @@ def build_dashboard(df: pd.DataFrame, out_html: Path):
         specs=[[{"type": "bar"}, {"type": "bar"}], [{"type": "pie"}, {"type": "scatter"}]],
     )
 
-    fig.add_trace(go.Bar(x=cause_counts["cause_category"], y=cause_counts["count"], name="Causes"), row=1, col=1)
-    fig.add_trace(go.Bar(x=op_counts["operation_type"], y=op_counts["count"], name="Operation type"), row=1, col=2)
-    fig.add_trace(go.Pie(labels=sev_counts["severity"], values=sev_counts["count"], name="Severity"), row=2, col=1)
+    fig.add_trace(go.Bar(x=cause_counts.index, y=cause_counts.values, name="Causes"), row=1, col=1)
+    fig.add_trace(go.Bar(x=op_counts.index, y=op_counts.values, name="Operation type"), row=1, col=2)
+    fig.add_trace(go.Pie(labels=sev_counts.index, values=sev_counts.values, name="Severity"), row=2, col=1)
     fig.add_trace(
-        go.Scatter(
-            x=timeline["occurrence_date"],
-            y=timeline["report_no"],
+        go.Scattergl(
+            x=timeline["occurrence_date"].values,
+            y=timeline["report_no"].values,
             mode="markers+lines",
-            text=timeline["title"],
+            text=timeline["title"].values,
             name="Timeline",
         ),
         row=2,
@@ -189,17 +268,21 @@ def build_dashboard(df: pd.DataFrame, out_html: Path):
         "cause_category",
         "severity",
         "investigation_status",
-        "report_url",
+        "report_url",  # keep last: rendered as a link
     ]
-    table_df = df[table_cols].copy()
-    table_html = table_df.to_html(index=False, escape=False)
+    header = "".join(f"<th>{c}</th>" for c in table_cols)
+    rows = "\n".join(
+        "<tr>" + "".join(f"<td>{_cell(v)}</td>" for v in r[:-1]) + f"<td>{_link_cell(r[-1])}</td></tr>"
+        for r in df[table_cols].itertuples(index=False)
+    )
+    table_html = f"<table border='1' class='dataframe'>\n<thead><tr>{header}</tr></thead>\n<tbody>\n{rows}\n</tbody>\n</table>"
 
     html = f"""
     <html>
     <head><meta charset='utf-8'><title>ATSB Dashboard</title></head>
     <body>
       <h1>ATSB Aviation - Latest 10 Investigation Reports</h1>
-      {fig.to_html(include_plotlyjs='cdn', full_html=False)}
+      {fig.to_html(include_plotlyjs='cdn', full_html=False, validate=False)}
       <h2>Report table</h2>
       {table_html}
       <p>Source: Australian Transport Safety Bureau (ATSB). Links in table point to original report pages.</p>
@@ -209,12 +292,12 @@ def build_dashboard(df: pd.DataFrame, out_html: Path):
     out_html.write_text(html, encoding="utf-8")
 
 
-def write_insights(df: pd.DataFrame, out_md: Path):
-    causes = df["cause_category"].value_counts()
-    ops = df["operation_type"].value_counts()
-    sev = df["severity"].value_counts()
+def write_insights(df: pd.DataFrame, counts: dict, out_md: Path):
+    causes = counts["cause_category"]
+    ops = counts["operation_type"]
+    sev = counts["severity"]
 
-    top_locations = Counter(df["location"]).most_common(5)
+    top_locations = df["location"].value_counts(sort=True).head(5)
     lines = [
         "# ATSB aviation reports - key insights (latest 10)",
         "",
@@ -232,7 +315,7 @@ def write_insights(df: pd.DataFrame, out_md: Path):
         lines.append(f"- {k}: {v}")
 
     lines += ["", "## Severity", *[f"- {k}: {v}" for k, v in sev.items()], "", "## Frequent locations"]
-    for loc, c in top_locations:
+    for loc, c in top_locations.items():
         lines.append(f"- {loc}: {c}")
 
     lines += [
@@ -249,25 +332,25 @@ def main():
     OUT_DIR.mkdir(exist_ok=True)
 
     listing = parse_listing(limit=10)
-    detailed = [fetch_report_detail(item) for item in listing]
-    df = pd.DataFrame(detailed)
-    df["occurrence_date"] = pd.to_datetime(df["occurrence_date"])
+    with ThreadPoolExecutor(max_workers=10) as ex:
+        detailed = list(ex.map(fetch_report_detail, listing))
+    df = classify_frame(pd.DataFrame(detailed))
 
-    json_ready = df.copy()
-    json_ready["occurrence_date"] = json_ready["occurrence_date"].dt.strftime("%Y-%m-%d")
-
-    df.to_csv(DATA_DIR / "reports.csv", index=False)
-    (DATA_DIR / "reports.json").write_text(json.dumps(json_ready.to_dict(orient="records"), indent=2), encoding="utf-8")
+    df.to_csv(DATA_DIR / "reports.csv", index=False, lineterminator="\n", date_format="%Y-%m-%d")
+    df.assign(occurrence_date=df["occurrence_date"].dt.strftime("%Y-%m-%d")).to_json(
+        DATA_DIR / "reports.json", orient="records", indent=2
+    )
 
-    write_insights(df, OUT_DIR / "insights.md")
-    build_dashboard(df, OUT_DIR / "dashboard.html")
+    counts = {c: df[c].value_counts(sort=True) for c in ("cause_category", "operation_type", "severity")}
+    write_insights(df, counts, OUT_DIR / "insights.md")
+    build_dashboard(df, counts, OUT_DIR / "dashboard.html")
 
     print("Created:")
     print("- data/reports.csv")
     print("- data/reports.json")
     print("- outputs/insights.md")
     print("- outputs/dashboard.html")
-    print("Top cause category:", df["cause_category"].value_counts().idxmax())
+    print("Top cause category:", counts["cause_category"].idxmax())
 
 
 if __name__ == "__main__":